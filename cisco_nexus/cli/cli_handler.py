@@ -1,8 +1,10 @@
-from collections import OrderedDict
-
+from cloudshell.cli.service.cli import CLI
 from cloudshell.cli.service.command_mode import CommandMode
+from cloudshell.cli.service.session_manager_impl import SessionManagerImpl
+from cloudshell.cli.service.session_pool_manager import SessionPoolManager
 from cloudshell.cli.session.ssh_session import SSHSession
 from cloudshell.cli.session.telnet_session import TelnetSession
+from cloudshell.networking.cisco.cisco_constants import DEFAULT_SESSION_POOL_TIMEOUT
 from cloudshell.networking.cisco.cli.cisco_cli_handler import CiscoCliHandler
 from cloudshell.networking.cisco.cli.cisco_command_modes import EnableCommandMode, \
     DefaultCommandMode, ConfigCommandMode
@@ -13,7 +15,24 @@ ConfigCommandMode.ENTER_COMMAND = "configure"
 
 class L1EnableCommandMode(EnableCommandMode):
     def enter_action_map(self):
-        return OrderedDict()
+        return {}
+
+
+class CiscoL1Cli(object):
+    """
+    CLI with own session pool, created once and shared by the cli handlers of all logins
+    """
+
+    def __init__(self, resource_config, pool_timeout=None):
+        # own session manager, the default one is shared by all the pools
+        session_pool = SessionPoolManager(
+            session_manager=SessionManagerImpl(),
+            max_pool_size=int(resource_config.sessions_concurrency_limit),
+            pool_timeout=pool_timeout or DEFAULT_SESSION_POOL_TIMEOUT)
+        self.cli = CLI(session_pool=session_pool)
+
+    def get_cli_handler(self, resource_config, logger):
+        return CiscoL1CliHandler(self.cli, resource_config, logger)
 
 
 class CiscoL1CliHandler(CiscoCliHandler):
@@ -22,10 +41,6 @@ class CiscoL1CliHandler(CiscoCliHandler):
         TelnetSession,
     )
 
-    def __init__(self, resource_config, logger):
-        super(CiscoL1CliHandler, self).__init__(None, resource_config, logger)
-        ConfigCommandMode.ENTER_COMMAND = "configure"
-
     @property
     def enable_mode(self):
         return self.modes[L1EnableCommandMode]
@@ -1,32 +1,124 @@
 #!/usr/bin/python
 # -*- coding: utf-8 -*-
 import re
+import socket
+import sys
+import threading
+from contextlib import contextmanager
+from functools import wraps
 
+from cloudshell.cli.session.session_exceptions import SessionException, CommandExecutionException
 from cloudshell.layer_one.core.driver_commands_interface import DriverCommandsInterface
 from cloudshell.layer_one.core.layer_one_driver_exception import LayerOneDriverException
-from cloudshell.layer_one.core.response.resource_info.entities.chassis import Chassis
-from cloudshell.layer_one.core.response.resource_info.entities.port import Port
 from cloudshell.layer_one.core.response.response_info import GetStateIdResponseInfo, \
     ResourceDescriptionResponseInfo, AttributeValueResponseInfo
 
-from cisco_nexus.cli.cli_handler import CiscoL1CliHandler
+from cisco_nexus.cli.cli_handler import CiscoL1Cli
+
+_PATCH_CREATED_RE = re.compile(r"patch created", re.IGNORECASE)
+_ADDED_TAP_RE = re.compile(r"Added input tap", re.IGNORECASE)
+_PATCH_DELETED_RE = re.compile(r"patch\s*(deleted|not found)", re.IGNORECASE)
+_TAP_REMOVED_RE = re.compile(r"Removed\s*(output|input)*\s*tap|Tap not found", re.IGNORECASE)
+# markers printed at most once per command, so their count in a batch proves every command
+# succeeded; "no tap" can print both removed input and output tap lines
+_SINGLE_MARKER_RES = (_PATCH_CREATED_RE, _ADDED_TAP_RE, _PATCH_DELETED_RE)
+# one port per line, fields can't run into the next line
+_IFACE_BRIEF_RE = re.compile(r"^[ \t]*(?P<iface>et\S+)[ \t]+"
+                             r"(?P<status>\w+)[ \t]+"
+                             r"(?P<transceiver>[^\r\n]+?)[ \t]+"
+                             r"(?P<speed>\d+)",
+                             re.IGNORECASE | re.MULTILINE)
+_MAPPING_RE = re.compile(r"(?P<src>et.+)\s+(?P<dst>et.+)", re.IGNORECASE)
+_OS_VERSION_CLEAN_RE = re.compile(r"system\s+version\s+|\n$", re.IGNORECASE)
+# sent after the commands of a batch, the device echoes it only when all of them are done
+_BATCH_END_COMMAND = "show clock"
+# errors of a connection dropped by the device
+_SESSION_ERRORS = (SessionException, socket.error, EOFError)
+
+
+def _normalize_port_name(port_name):
+    """
+    Normalize interface name, 'Eth1/1 ' -> 'ethernet1/1'
+    :type port_name: str
+    :rtype: str
+    """
+    port_name = port_name.strip().lower()
+    if port_name.startswith("ethernet"):
+        return port_name
+    if port_name.startswith("eth"):
+        return "ethernet" + port_name[3:]
+    if port_name.startswith("et"):
+        return "ethernet" + port_name[2:]
+    return port_name
+
+
+class _ParsedPort(object):
+    """
+    Port parsed from 'show interface brief', before the Port entity is built
+    """
+    __slots__ = ("name", "speed")
+
+    def __init__(self, name, speed):
+        self.name = name
+        self.speed = speed
+
+
+def _retry_on_dropped_session(method):
+    """
+    Run the driver command once more on a new cli session, if the kept session
+    was dropped by the device since the previous command
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        session_kept = self._session is not None
+        try:
+            return method(self, *args, **kwargs)
+        except _SESSION_ERRORS as e:
+            # errors reported by the device are not fixed by a new session
+            if not session_kept or isinstance(e, CommandExecutionException):
+                raise
+            self._logger.debug("Cli session was dropped, retrying on a new one: {}".format(e))
+            return method(self, *args, **kwargs)
+    return wrapper
 
 
 class CiscoL1ResourceConfig:
+    # {id(runtime_config): (runtime_config,
+    #                        (cli_connection_type, cli_tcp_port, sessions_concurrency_limit))}
+    _RUNTIME_CACHE = {}
+
     def __init__(self, address, user, password, runtime_config):
         self.address = address
         self.user = user
         self.password = password
-        self.sessions_concurrency_limit = 1
         self._runtime_config = runtime_config
+        (self.cli_connection_type,
+         self.cli_tcp_port,
+         self.sessions_concurrency_limit) = self._read_cli_config(runtime_config)
+
+    @classmethod
+    def _read_cli_config(cls, runtime_config):
+        """
+        Read cli connection type, port and sessions limit, once per runtime config
+        :type runtime_config: cloudshell.layer_one.core.helper.runtime_configuration.RuntimeConfiguration
+        :return: cli connection type, cli tcp port, sessions concurrency limit
+        :rtype: tuple
+        """
+        cached = cls._RUNTIME_CACHE.get(id(runtime_config))
+        # keep the config object in the entry, so a reused id is not mistaken for a cache hit
+        if cached and cached[0] is runtime_config:
+            return cached[1]
         cli_connection_type = runtime_config.read_key("CLI.TYPE", True)
         cli_tcp_port = runtime_config.read_key("CLI.PORTS", True)
+        sessions_concurrency_limit = int(runtime_config.read_key("CLI.SESSION_LIMIT", 1))
         if len(cli_connection_type) > 1:
-            self.cli_connection_type = "Auto"
-            self.cli_tcp_port = None
+            cli_config = ("Auto", None, sessions_concurrency_limit)
         else:
-            self.cli_connection_type = cli_connection_type[0]
-            self.cli_tcp_port = cli_tcp_port.get(self.cli_connection_type)
+            cli_config = (cli_connection_type[0],
+                          cli_tcp_port.get(cli_connection_type[0]),
+                          sessions_concurrency_limit)
+        cls._RUNTIME_CACHE[id(runtime_config)] = (runtime_config, cli_config)
+        return cli_config
 
 
 class DriverCommands(DriverCommandsInterface):
@@ -43,7 +135,11 @@ class DriverCommands(DriverCommandsInterface):
         self._runtime_config = runtime_config
         self._resource_config = None
         self.cli = None
+        self._cisco_cli = None
         self._switch_id = None
+        self._session_lock = threading.Lock()
+        self._session_context = None
+        self._session = None
 
     def login(self, address, username, password):
         """
@@ -63,12 +159,75 @@ class DriverCommands(DriverCommandsInterface):
                 device_info = session.send_command('show version')
                 self._logger.info(device_info)
         """
+        resource_config = self._resource_config
+        # the pool gives the released session to the next login with the same credentials
+        credentials_changed = (resource_config is None or
+                               (resource_config.address, resource_config.user,
+                                resource_config.password) != (address, username, password))
+        with self._session_lock:
+            self._close_session(disconnect=credentials_changed)
         self._resource_config = CiscoL1ResourceConfig(address, username, password,
                                                       self._runtime_config)
-        self.cli = CiscoL1CliHandler(self._resource_config, self._logger)
-        with self.cli.enable_mode_service() as session:
+        if self._cisco_cli is None:
+            self._cisco_cli = CiscoL1Cli(self._resource_config)
+        self.cli = self._cisco_cli.get_cli_handler(self._resource_config, self._logger)
+        with self._enable_mode() as session:
             self._switch_id = self._get_serial_number(session)
 
+    def close(self):
+        """
+        Release the cli session held by the driver
+        :return: None
+        """
+        with self._session_lock:
+            self._close_session()
+
+    def _close_session(self, exc_type=None, exc_val=None, exc_tb=None, disconnect=True):
+        """
+        Release the kept session. A disconnected session is removed by the pool,
+        otherwise the pool keeps it for the next use
+        """
+        if self._session_context is not None:
+            session_context = self._session_context
+            session = self._session.session
+            self._session_context = None
+            self._session = None
+            if disconnect:
+                try:
+                    session.disconnect()
+                except Exception as e:
+                    self._logger.debug("Failed to disconnect cli session: {}".format(e))
+            session_context.__exit__(exc_type, exc_val, exc_tb)
+
+    @contextmanager
+    def _enable_mode(self):
+        """
+        Cli session in enable mode, opened once and kept between driver commands.
+        The session is dropped if a command fails or it was disconnected, and
+        reopened on next use, see _retry_on_dropped_session
+        """
+        with self._session_lock:
+            if self._session is not None and not self._session.session.active():
+                self._close_session()
+            if self._session is None:
+                session_context = self.cli.enable_mode_service()
+                self._session = session_context.__enter__()
+                self._session_context = session_context
+            try:
+                yield self._session
+            except Exception:
+                self._close_session(*sys.exc_info())
+                raise
+
+    @contextmanager
+    def _config_mode(self):
+        """
+        Enter config mode on the kept session, back to enable mode on exit
+        """
+        with self._enable_mode() as session:
+            with session.enter_mode(self.cli.config_mode) as config_session:
+                yield config_session
+
     def get_state_id(self):
         """
         Check if CS synchronized with the device.
@@ -101,6 +260,7 @@ class DriverCommands(DriverCommandsInterface):
         """
         pass
 
+    @_retry_on_dropped_session
     def map_bidi(self, src_port, dst_port):
         """
         Create a bidirectional connection between source and destination ports
@@ -116,7 +276,7 @@ class DriverCommands(DriverCommandsInterface):
                 session.send_command('map bidir {0} {1}'.format(convert_port(src_port), convert_port(src_port)))
 
         """
-        with self.cli.config_mode_service() as session:
+        with self._config_mode() as session:
             src = self._convert_port_address(src_port)
             dst = self._convert_port_address(dst_port)
             self._enable_port(session, src)
@@ -124,12 +284,13 @@ class DriverCommands(DriverCommandsInterface):
             result = session.send_command("patch {src} {dst}".format(
                 src=src,
                 dst=dst))
-            if not re.search("patch created", result, re.IGNORECASE):
+            if not _PATCH_CREATED_RE.search(result):
                 raise LayerOneDriverException(
                     "Failed to create mapping between {src} {dst}".format(
                         src=src,
                         dst=dst))
 
+    @_retry_on_dropped_session
     def map_uni(self, src_port, dst_ports):
         """
         Unidirectional mapping of two ports
@@ -145,21 +306,72 @@ class DriverCommands(DriverCommandsInterface):
                 for dst_port in dst_ports:
                     session.send_command('map {0} also-to {1}'.format(convert_port(src_port), convert_port(dst_port)))
         """
-        with self.cli.config_mode_service() as session:
-            for dst_port in dst_ports:
-                src = self._convert_port_address(src_port)
-                dst = self._convert_port_address(dst_port)
-                self._enable_port(session, src)
-                self._enable_port(session, dst)
-                result = session.send_command("tap {src} {dst}".format(
-                    src=src,
-                    dst=dst))
-                if not re.search("Added input tap", result, re.IGNORECASE):
-                    raise LayerOneDriverException(
-                        "Failed to create mapping between {src} {dst}".format(
-                            src=src,
-                            dst=dst))
+        src = self._convert_port_address(src_port)
+        dst_list = [self._convert_port_address(dst_port) for dst_port in dst_ports]
+        concurrency = min(self._resource_config.sessions_concurrency_limit, len(dst_list))
+        if concurrency > 1:
+            self._map_uni_concurrently(src, dst_list, concurrency)
+        else:
+            with self._config_mode() as session:
+                self._map_uni(session, src, dst_list)
 
+    def _map_uni(self, session, src, dst_list):
+        """
+        Create tap mappings from src to every dst
+        :param session: cli service in config mode
+        :param src: converted src port, 'ethernet1/1'
+        :type src: str
+        :param dst_list: converted dst ports, ['ethernet1/2', 'ethernet1/3']
+        :type dst_list: list
+        """
+        commands = self._enable_port_commands(src)
+        checks = {}
+        for dst in dst_list:
+            commands.extend(self._enable_port_commands(dst))
+            command = "tap {src} {dst}".format(src=src, dst=dst)
+            commands.append(command)
+            checks[command] = (_ADDED_TAP_RE,
+                               "Failed to create mapping between {src} {dst}".format(
+                                   src=src,
+                                   dst=dst))
+        output = self._send_batch(session, commands)
+        self._validate_batch(commands, output, checks)
+
+    def _map_uni_concurrently(self, src, dst_list, concurrency):
+        """
+        Split dst ports between several cli sessions and create tap mappings in parallel
+        :param src: converted src port, 'ethernet1/1'
+        :type src: str
+        :param dst_list: converted dst ports, ['ethernet1/2', 'ethernet1/3']
+        :type dst_list: list
+        :param concurrency: number of sessions to use
+        :type concurrency: int
+        """
+        errors = []
+        errors_lock = threading.Lock()
+
+        def run(session_context, dst_group):
+            try:
+                with session_context as session:
+                    self._map_uni(session, src, dst_group)
+            except Exception as e:
+                with errors_lock:
+                    errors.append(str(e))
+
+        # the first group goes to the kept driver session, the others get their own
+        threads = [threading.Thread(target=run,
+                                    args=(self._config_mode() if index == 0
+                                          else self.cli.config_mode_service(),
+                                          dst_list[index::concurrency]))
+                   for index in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        if errors:
+            raise LayerOneDriverException(", ".join(errors))
+
+    @_retry_on_dropped_session
     def get_resource_description(self, address):
         """
         Auto-load function to retrieve all information from the device
@@ -169,9 +381,12 @@ class DriverCommands(DriverCommandsInterface):
         :rtype: cloudshell.layer_one.core.response.response_info.ResourceDescriptionResponseInfo
         :raises cloudshell.layer_one.core.layer_one_driver_exception.LayerOneDriverException: Layer one exception.
         """
-        port_dict = {}
+        # resource entities are needed by autoload only
+        from cloudshell.layer_one.core.response.resource_info.entities.chassis import Chassis
+        from cloudshell.layer_one.core.response.resource_info.entities.port import Port
+
         Port.NAME_TEMPLATE = "{}"
-        with self.cli.config_mode_service() as session:
+        with self._config_mode() as session:
 
             model = "Cisco L1 Nexus Chassis"
             serial = self._get_serial_number(session)
@@ -182,54 +397,143 @@ class DriverCommands(DriverCommandsInterface):
             chassis.set_model_name(model_name)
             chassis.set_os_version(os_version)
             ports_out = session.send_command("show interface brief")
-            port_match = re.findall(r"(?P<iface>et.+?)\s+"
-                                    r"(?P<status>\w+)\s+"
-                                    r"(?P<transceiver>.+?)\s+"
-                                    r"(?P<speed>\d+)",
-                                    ports_out,
-                                    re.IGNORECASE
-                                    )
-            for port_name, status, _, speed in port_match:
-                port_name = re.sub(r"et(hernet)*", "ethernet", port_name, flags=(
-                    re.IGNORECASE))
-                port = Port(port_name.replace("/", "-"), 'Generic L1 Port')
-                port.set_port_speed(speed)
-                port.set_parent_resource(chassis)
-                port_dict[port_name] = port
+            parsed_ports = [_ParsedPort(_normalize_port_name(match.group("iface")),
+                                        match.group("speed"))
+                            for match in _IFACE_BRIEF_RE.finditer(ports_out)]
+            port_index = {parsed_port.name: index
+                          for index, parsed_port in enumerate(parsed_ports)}
+            # (index, mapped index) pairs, applied in order, so tap mappings override bidi ones
+            mappings = []
             bidi_mappings = self._get_bidi_mappings(session)
             for src, dst in bidi_mappings.items():
-                src_port = port_dict.get(src)
-                dst_port = port_dict.get(dst)
-                if src_port and dst_port:
-                    src_port.add_mapping(dst_port)
-                    dst_port.add_mapping(src_port)
+                src_index = port_index.get(src)
+                dst_index = port_index.get(dst)
+                if src_index is not None and dst_index is not None:
+                    mappings.append((src_index, dst_index))
+                    mappings.append((dst_index, src_index))
             tap_mappings = self._get_tap_mappings(session)
             for src, dst in tap_mappings.items():
-                src_port = port_dict.get(src)
-                dst_port = port_dict.get(dst)
-                if src_port and dst_port:
-                    src_port.add_mapping(dst_port)
+                src_index = port_index.get(src)
+                dst_index = port_index.get(dst)
+                if src_index is not None and dst_index is not None:
+                    mappings.append((src_index, dst_index))
+
+        ports = []
+        for parsed_port in parsed_ports:
+            port = Port(parsed_port.name.replace("/", "-"), 'Generic L1 Port')
+            port.set_port_speed(parsed_port.speed)
+            port.set_parent_resource(chassis)
+            ports.append(port)
+        for index, mapped_index in mappings:
+            ports[index].add_mapping(ports[mapped_index])
 
         return ResourceDescriptionResponseInfo([chassis])
 
     def _enable_port(self, session, port):
-        session.send_command("interface {}".format(port),
-                             remove_prompt=True)
-        session.send_command("no shutdown",
-                             remove_prompt=True)
+        for command in self._enable_port_commands(port):
+            session.send_command(command, remove_prompt=True)
+
+    @staticmethod
+    def _enable_port_commands(port):
+        return ["interface {}".format(port), "no shutdown"]
+
+    @staticmethod
+    def _disable_port_commands(port):
+        return ["interface {}".format(port), "shutdown"]
+
+    def _send_batch(self, session, commands):
+        """
+        Send several commands to the device in one request
+        :param session: cli service
+        :param commands: list of commands
+        :type commands: list
+        :return: output of all the commands, including commands echo
+        :rtype: str
+        """
+        if not commands:
+            return ""
+        # the last command can repeat an earlier one or be a prefix of it,
+        # so wait for the prompt following the echo of the closing command
+        expected_string = r"{command}.*{prompt}".format(command=re.escape(_BATCH_END_COMMAND),
+                                                        prompt=session.command_mode.prompt)
+        output = session.send_command("\n".join(commands + [_BATCH_END_COMMAND]),
+                                      expected_string=expected_string,
+                                      remove_command_from_output=False)
+        end = output.rfind(_BATCH_END_COMMAND)
+        if end < 0:
+            return output
+        return output[:end]
 
-    def _disable_port(self, session, port):
-        session.send_command("interface {}".format(port),
-                             remove_prompt=True)
-        session.send_command("shutdown",
-                             remove_prompt=True)
+    @staticmethod
+    def _split_batch_output(commands, output):
+        """
+        Split batch output by commands echo
+        :param commands: list of commands
+        :type commands: list
+        :param output: output of the batch
+        :type output: str
+        :return: list of outputs in the same order as commands
+        :rtype: list
+        """
+        # match the whole echo line, a command can be a prefix of another one
+        echoes = [re.compile(r"{}[ \t\r]*$".format(re.escape(command)), re.MULTILINE)
+                  for command in commands]
+        outputs = []
+        position = 0
+        for index, echo in enumerate(echoes):
+            match = echo.search(output, position)
+            if not match:
+                outputs.append("")
+                continue
+            start = match.end()
+            end = len(output)
+            if index + 1 < len(echoes):
+                next_match = echoes[index + 1].search(output, start)
+                if next_match:
+                    end = next_match.start()
+            outputs.append(output[start:end])
+            position = end
+        return outputs
+
+    def _validate_batch(self, commands, output, checks):
+        """
+        Verify output of every checked command of the batch
+        :param commands: list of commands
+        :type commands: list
+        :param output: output of the batch
+        :type output: str
+        :param checks: {command: (compiled success pattern, error message)}
+        :type checks: dict
+        :raises cloudshell.layer_one.core.layer_one_driver_exception.LayerOneDriverException: if
+            any of the commands failed
+        """
+        expected_counts = {}
+        for pattern, _ in checks.values():
+            expected_counts[pattern] = expected_counts.get(pattern, 0) + 1
+        if all(pattern in _SINGLE_MARKER_RES and len(pattern.findall(output)) == count
+               for pattern, count in expected_counts.items()):
+            return
+        # some markers are missing or can repeat, check every command
+        errors = []
+        for command, command_output in zip(commands,
+                                           self._split_batch_output(commands, output)):
+            if command not in checks:
+                continue
+            pattern, error_message = checks[command]
+            if not pattern.search(command_output):
+                errors.append(error_message)
+        if errors:
+            raise LayerOneDriverException(", ".join(errors))
 
     def _get_serial_number(self, session):
         serial_number = session.send_command("show version | grep Serial",
                                              remove_prompt=True)
-        result = re.sub("serial\s+number\s+|\n$", "", serial_number, flags=(
-            re.IGNORECASE))
-        return str(result)
+        # collapse whitespace runs, the label may be split by several spaces or tabs
+        result = " ".join(str(serial_number).split())
+        index = result.lower().find("serial number")
+        if index >= 0:
+            result = result[index + len("serial number"):].lstrip()
+        return result
 
     def _get_model_name(self, session):
         result = session.send_command("show version | head -1",
@@ -239,22 +543,26 @@ class DriverCommands(DriverCommandsInterface):
     def _get_os_version(self, session):
         os_version = session.send_command("show version | grep 'System version'",
                                           remove_prompt=True)
-        result = re.sub("system\s+version\s+|\n$", "", os_version, flags=(
-            re.IGNORECASE))
+        result = _OS_VERSION_CLEAN_RE.sub("", os_version)
         return str(result)
 
     def _get_bidi_mappings(self, session):
         mappings = session.send_command("show config running-config patch")
-        return dict(re.findall(r"(?P<src>et.+)\s+(?P<dst>et.+)",
-                               mappings,
-                               re.IGNORECASE))
+        if not mappings or "et" not in mappings.lower():
+            return {}
+        return dict((_normalize_port_name(match.group("src")),
+                     _normalize_port_name(match.group("dst")))
+                    for match in _MAPPING_RE.finditer(mappings))
 
     def _get_tap_mappings(self, session):
         mappings = session.send_command("show config running-config tap")
-        return {dst: src for src, dst in re.findall(r"(?P<src>et.+)\s+(?P<dst>et.+)",
-                                                    mappings,
-                                                    re.IGNORECASE)}
+        if not mappings or "et" not in mappings.lower():
+            return {}
+        return dict((_normalize_port_name(match.group("dst")),
+                     _normalize_port_name(match.group("src")))
+                    for match in _MAPPING_RE.finditer(mappings))
 
+    @_retry_on_dropped_session
     def map_clear(self, ports):
         """
         Remove simplex/multi-cast/duplex connection ending on the destination port
@@ -274,19 +582,55 @@ class DriverCommands(DriverCommandsInterface):
                 if exceptions:
                     raise Exception('self.__class__.__name__', ','.join(exceptions))
         """
-        for port in ports:
-            with self.cli.config_mode_service() as session:
-                src_port = self._convert_port_address(port)
-                dst_port = self._get_bidi_mappings(session).get("src_port")
-                self._remove_bidi_mapping(session, src_port, dst_port)
-                self._remove_bidi_mapping(session, dst_port, src_port)
-                self._disable_port(session, src_port)
-                self._disable_port(session, dst_port)
-                dst_port = self._get_tap_mappings(session).get("src_port")
-                self._remove_tap_mapping(session, src_port, dst_port)
-                self._remove_tap_mapping(session, dst_port, src_port)
-                self._disable_port(session, dst_port)
-
+        with self._config_mode() as session:
+            bidi_mappings = self._get_bidi_mappings(session)
+            tap_mappings = self._get_tap_mappings(session)
+            bidi_reversed = {dst: src for src, dst in bidi_mappings.items()}
+            tap_destinations = {}
+            for dst, src in tap_mappings.items():
+                tap_destinations.setdefault(src, []).append(dst)
+            commands = []
+            checks = {}
+            affected_ports = []
+            removed_bidi = set()
+            removed_taps = set()
+            for port in ports:
+                port_name = _normalize_port_name(self._convert_port_address(port))
+                port_bidi = []
+                if port_name in bidi_mappings:
+                    port_bidi.append((port_name, bidi_mappings[port_name]))
+                if port_name in bidi_reversed:
+                    port_bidi.append((bidi_reversed[port_name], port_name))
+                port_taps = []
+                if port_name in tap_mappings:
+                    port_taps.append((tap_mappings[port_name], port_name))
+                port_taps.extend((port_name, dst) for dst in tap_destinations.get(port_name, []))
+                for src, dst in port_bidi:
+                    self._remove_bidi_mapping(commands, checks, src, dst)
+                for src, dst in port_taps:
+                    self._remove_tap_mapping(commands, checks, src, dst)
+                removed_bidi.update(port_bidi)
+                removed_taps.update(port_taps)
+                affected_ports.append(port_name)
+                affected_ports.extend(peer for pair in port_bidi + port_taps for peer in pair)
+            # a peer still used by a mapping that is not removed stays enabled
+            mapped_ports = set()
+            for src, dst in bidi_mappings.items():
+                if (src, dst) not in removed_bidi:
+                    mapped_ports.update((src, dst))
+            for dst, src in tap_mappings.items():
+                if (src, dst) not in removed_taps:
+                    mapped_ports.update((src, dst))
+            disabled_ports = []
+            for port_name in affected_ports:
+                if port_name not in mapped_ports and port_name not in disabled_ports:
+                    disabled_ports.append(port_name)
+            for port_name in disabled_ports:
+                commands.extend(self._disable_port_commands(port_name))
+            output = self._send_batch(session, commands)
+            self._validate_batch(commands, output, checks)
+
+    @_retry_on_dropped_session
     def map_clear_to(self, src_port, dst_ports):
         """
         Remove simplex/multi-cast/duplex connection ending on the destination port
@@ -298,37 +642,46 @@ class DriverCommands(DriverCommandsInterface):
         :return: None
         :raises Exception: if command failed
         """
-        with self.cli.config_mode_service() as session:
+        src = self._convert_port_address(src_port)
+        with self._config_mode() as session:
+            commands = []
+            checks = {}
             for dst_port in dst_ports:
-                src = self._convert_port_address(src_port)
                 dst = self._convert_port_address(dst_port)
-                self._remove_bidi_mapping(session, src, dst)
-                self._remove_bidi_mapping(session, dst, src)
-                self._remove_tap_mapping(session, src, dst)
-                self._remove_tap_mapping(session, dst, src)
-                self._disable_port(session, src)
-                self._disable_port(session, dst)
-
-    def _remove_bidi_mapping(self, session, src_port, dst_port):
-        result = session.send_command("no patch {src} {dst}".format(
-            src=src_port,
-            dst=dst_port))
-        if not re.search("patch\s*(deleted|not found)", result, re.IGNORECASE):
-            raise LayerOneDriverException(
-                "Failed to delete bidi mapping between {src} {dst}".format(
-                    src=src_port,
-                    dst=dst_port))
-
-    def _remove_tap_mapping(self, session, src_port, dst_port):
-        result = session.send_command("no tap {src} {dst}".format(
-            src=src_port,
-            dst=dst_port))
-        if not re.search(r"Removed\s*(output|input)*\s*tap|Tap not found", result,
-                         re.IGNORECASE):
-            raise LayerOneDriverException(
-                "Failed to delete tap mapping between {src} {dst}".format(
-                    src=src_port,
-                    dst=dst_port))
+                self._remove_bidi_mapping(commands, checks, src, dst)
+                self._remove_bidi_mapping(commands, checks, dst, src)
+                self._remove_tap_mapping(commands, checks, src, dst)
+                self._remove_tap_mapping(commands, checks, dst, src)
+                commands.extend(self._disable_port_commands(dst))
+            commands.extend(self._disable_port_commands(src))
+            output = self._send_batch(session, commands)
+            self._validate_batch(commands, output, checks)
+
+    @staticmethod
+    def _remove_bidi_mapping(commands, checks, src_port, dst_port):
+        if not src_port or not dst_port:
+            return
+        command = "no patch {src} {dst}".format(src=src_port, dst=dst_port)
+        if command in checks:
+            return
+        commands.append(command)
+        checks[command] = (_PATCH_DELETED_RE,
+                           "Failed to delete bidi mapping between {src} {dst}".format(
+                               src=src_port,
+                               dst=dst_port))
+
+    @staticmethod
+    def _remove_tap_mapping(commands, checks, src_port, dst_port):
+        if not src_port or not dst_port:
+            return
+        command = "no tap {src} {dst}".format(src=src_port, dst=dst_port)
+        if command in checks:
+            return
+        commands.append(command)
+        checks[command] = (_TAP_REMOVED_RE,
+                           "Failed to delete tap mapping between {src} {dst}".format(
+                               src=src_port,
+                               dst=dst_port))
 
     def get_attribute_value(self, cs_address, attribute_name):
         """
@@ -408,7 +761,8 @@ if __name__ == "__main__":
     _logger = get_qs_logger()
     _runtime_config_instance = Mock()
     _runtime_config_instance.read_key.side_effect = [["SSH", "TELNET"], {"SSH": 22,
-                                                                         "TELNET": 23}]
+                                                                         "TELNET": 23},
+                                                     1]
     driver = DriverCommands(_logger, _runtime_config_instance)
     driver.login("192.168.23.10", "admin", "admin")
     response = driver.get_resource_description("192.168.23.10")
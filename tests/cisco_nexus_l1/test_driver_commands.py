@@ -1,14 +1,40 @@
+import re
+import socket
+from itertools import chain, repeat
 from unittest import TestCase
 
-from mock import Mock
+from mock import Mock, MagicMock, patch
 
 from cloudshell.layer_one.core.driver_commands_interface import DriverCommandsInterface
-from cisco_nexus.driver_commands import DriverCommands
+from cloudshell.layer_one.core.layer_one_driver_exception import LayerOneDriverException
+from cisco_nexus.cli.cli_handler import CiscoL1CliHandler
+from cisco_nexus.driver_commands import DriverCommands, CiscoL1ResourceConfig
 
 
 
 
 
+class TestCiscoL1ResourceConfig(TestCase):
+    def test_runtime_config_read_once(self):
+        runtime_config = Mock()
+        runtime_config.read_key.side_effect = [["SSH"], {"SSH": 22, "TELNET": 23}, 2]
+        config = CiscoL1ResourceConfig("192.168.1.1", "admin", "admin", runtime_config)
+        self.assertEqual(config.cli_connection_type, "SSH")
+        self.assertEqual(config.cli_tcp_port, 22)
+        config = CiscoL1ResourceConfig("192.168.1.1", "admin", "admin", runtime_config)
+        self.assertEqual(config.cli_connection_type, "SSH")
+        self.assertEqual(config.cli_tcp_port, 22)
+        self.assertEqual(config.sessions_concurrency_limit, 2)
+        self.assertEqual(runtime_config.read_key.call_count, 3)
+
+    def test_auto_connection_type(self):
+        runtime_config = Mock()
+        runtime_config.read_key.side_effect = [["SSH", "TELNET"], {"SSH": 22, "TELNET": 23}, 1]
+        config = CiscoL1ResourceConfig("192.168.1.1", "admin", "admin", runtime_config)
+        self.assertEqual(config.cli_connection_type, "Auto")
+        self.assertIsNone(config.cli_tcp_port)
+
+
 class TestDriverCommands(TestCase):
     def setUp(self):
         self._logger = Mock()
@@ -17,3 +43,303 @@ class TestDriverCommands(TestCase):
 
     def test_implementing_interface(self):
         self.assertIsInstance(self._instance, DriverCommandsInterface)
+
+    def _mock_session(self, sessions_concurrency_limit=1):
+        self._instance._resource_config = Mock(
+            sessions_concurrency_limit=sessions_concurrency_limit)
+        self._instance.cli = MagicMock()
+        enable_session = self._instance.cli.enable_mode_service.return_value.__enter__.return_value
+        session = enable_session.enter_mode.return_value.__enter__.return_value
+        self._instance.cli.config_mode_service.return_value.__enter__.return_value = session
+        session.command_mode.prompt = r"\(config.*\)#\s*$"
+        return session
+
+    def test_map_uni_sends_one_batch(self):
+        session = self._mock_session()
+        session.send_command.return_value = ("(config)# interface ethernet1/1\n"
+                                             "(config-if)# no shutdown\n"
+                                             "(config-if)# interface ethernet1/2\n"
+                                             "(config-if)# no shutdown\n"
+                                             "(config-if)# tap ethernet1/1 ethernet1/2\n"
+                                             "Added input tap\n"
+                                             "(config-if)# interface ethernet1/3\n"
+                                             "(config-if)# no shutdown\n"
+                                             "(config-if)# tap ethernet1/1 ethernet1/3\n"
+                                             "Added input tap\n"
+                                             "(config-if)# ")
+        self._instance.map_uni("192.168.1.1/ethernet1-1",
+                               ["192.168.1.1/ethernet1-2", "192.168.1.1/ethernet1-3"])
+        self.assertEqual(session.send_command.call_count, 1)
+        command = session.send_command.call_args[0][0]
+        self.assertEqual(command.count("interface ethernet1/1"), 1)
+        self.assertIn("tap ethernet1/1 ethernet1/2\n", command)
+        self.assertTrue(command.endswith("tap ethernet1/1 ethernet1/3\nshow clock"))
+
+    def test_batch_waits_for_all_commands(self):
+        session = self._mock_session()
+        output = ("(config-if)# tap ethernet1/1 ethernet1/30\n"
+                  "Added input tap\n"
+                  "(config-if)# ")
+        session.send_command.return_value = output
+        with self.assertRaises(LayerOneDriverException) as context:
+            self._instance.map_uni("192.168.1.1/ethernet1-1",
+                                   ["192.168.1.1/ethernet1-30", "192.168.1.1/ethernet1-3"])
+        self.assertNotIn("ethernet1/30", str(context.exception))
+        expected_string = session.send_command.call_args[1]["expected_string"]
+        self.assertIsNone(re.search(expected_string, output, re.DOTALL))
+        output += ("interface ethernet1/3\n"
+                   "(config-if)# no shutdown\n"
+                   "(config-if)# tap ethernet1/1 ethernet1/3\n"
+                   "Added input tap\n"
+                   "(config-if)# show clock\n"
+                   "10:20:30.123 UTC Wed Oct 14 2026\n"
+                   "(config-if)# ")
+        self.assertIsNotNone(re.search(expected_string, output, re.DOTALL))
+
+    def test_map_uni_reports_failed_ports(self):
+        session = self._mock_session()
+        session.send_command.return_value = ("(config-if)# tap ethernet1/1 ethernet1/2\n"
+                                             "Added input tap\n"
+                                             "(config-if)# tap ethernet1/1 ethernet1/3\n"
+                                             "ERROR: Invalid interface\n"
+                                             "(config-if)# ")
+        with self.assertRaises(LayerOneDriverException) as context:
+            self._instance.map_uni("192.168.1.1/ethernet1-1",
+                                   ["192.168.1.1/ethernet1-2", "192.168.1.1/ethernet1-3"])
+        self.assertIn("ethernet1/1 ethernet1/3", str(context.exception))
+        self.assertNotIn("ethernet1/2", str(context.exception))
+
+    def test_map_uni_concurrently(self):
+        session = self._mock_session(sessions_concurrency_limit=2)
+        session.send_command.side_effect = lambda command, **kwargs: "\n".join(
+            line + "\nAdded input tap" if line.startswith("tap") else line
+            for line in command.split("\n")) + "\n(config-if)# "
+        self._instance.map_uni("192.168.1.1/ethernet1-1",
+                               ["192.168.1.1/ethernet1-2",
+                                "192.168.1.1/ethernet1-3",
+                                "192.168.1.1/ethernet1-4"])
+        self.assertEqual(self._instance.cli.enable_mode_service.call_count, 1)
+        self.assertEqual(self._instance.cli.config_mode_service.call_count, 1)
+        self.assertEqual(session.send_command.call_count, 2)
+        commands = "\n".join(call[0][0] for call in session.send_command.call_args_list)
+        self.assertEqual(commands.count("tap ethernet1/1"), 3)
+
+    def test_map_uni_concurrently_reports_failed_ports(self):
+        session = self._mock_session(sessions_concurrency_limit=2)
+        session.send_command.side_effect = lambda command, **kwargs: command + "\n(config-if)# "
+        with self.assertRaises(LayerOneDriverException) as context:
+            self._instance.map_uni("192.168.1.1/ethernet1-1",
+                                   ["192.168.1.1/ethernet1-2", "192.168.1.1/ethernet1-3"])
+        self.assertIn("ethernet1/1 ethernet1/2", str(context.exception))
+        self.assertIn("ethernet1/1 ethernet1/3", str(context.exception))
+
+    def test_map_clear_to_sends_one_batch(self):
+        session = self._mock_session()
+        session.send_command.return_value = ("(config)# no patch ethernet1/1 ethernet1/2\n"
+                                             "patch deleted\n"
+                                             "(config)# no patch ethernet1/2 ethernet1/1\n"
+                                             "patch not found\n"
+                                             "(config)# no tap ethernet1/1 ethernet1/2\n"
+                                             "Tap not found\n"
+                                             "(config)# no tap ethernet1/2 ethernet1/1\n"
+                                             "Tap not found\n"
+                                             "(config)# interface ethernet1/2\n"
+                                             "(config-if)# shutdown\n"
+                                             "(config-if)# interface ethernet1/1\n"
+                                             "(config-if)# shutdown\n"
+                                             "(config-if)# ")
+        self._instance.map_clear_to("192.168.1.1/ethernet1-1", ["192.168.1.1/ethernet1-2"])
+        self.assertEqual(session.send_command.call_count, 1)
+
+    def test_map_clear_to_checks_every_tap_removal(self):
+        session = self._mock_session()
+        session.send_command.return_value = ("(config)# no patch ethernet1/1 ethernet1/2\n"
+                                             "patch deleted\n"
+                                             "(config)# no patch ethernet1/2 ethernet1/1\n"
+                                             "patch not found\n"
+                                             "(config)# no tap ethernet1/1 ethernet1/2\n"
+                                             "Removed input tap\n"
+                                             "Removed output tap\n"
+                                             "(config)# no tap ethernet1/2 ethernet1/1\n"
+                                             "ERROR: Invalid interface\n"
+                                             "(config)# interface ethernet1/2\n"
+                                             "(config-if)# shutdown\n"
+                                             "(config-if)# interface ethernet1/1\n"
+                                             "(config-if)# shutdown\n"
+                                             "(config-if)# ")
+        with self.assertRaises(LayerOneDriverException) as context:
+            self._instance.map_clear_to("192.168.1.1/ethernet1-1", ["192.168.1.1/ethernet1-2"])
+        self.assertIn("ethernet1/2 ethernet1/1", str(context.exception))
+
+    def test_get_resource_description_mappings(self):
+        session = self._mock_session()
+        session.send_command.side_effect = [
+            "Processor Board ID ABC123\n",
+            "Cisco Nexus Operating System (NX-OS) Software\n",
+            "System version: 7.0\n",
+            "Port          Status  Transceiver      Speed\n"
+            "Eth1/1        up      10G-SR           10000\n"
+            "Eth1/2        up      10G-SR           10000\n"
+            "Eth1/3        down    SFP not inserted 10000\n"
+            "Eth1/4        down\n"
+            "mgmt0         up      --               1000\n",
+            "patch Ethernet1/1 Ethernet1/2\r\n",
+            "tap Ethernet1/1 Ethernet1/3\r\n",
+        ]
+        response = self._instance.get_resource_description("192.168.1.1")
+        chassis = response.resource_info_list[0]
+        ports = chassis.child_resources
+        self.assertEqual(sorted(ports), ["ethernet1-1", "ethernet1-2", "ethernet1-3"])
+        self.assertIs(ports["ethernet1-1"].mapping, ports["ethernet1-2"])
+        self.assertIs(ports["ethernet1-2"].mapping, ports["ethernet1-1"])
+        self.assertIs(ports["ethernet1-3"].mapping, ports["ethernet1-1"])
+
+    def test_session_kept_between_commands(self):
+        session = self._mock_session()
+        session.send_command.return_value = "patch created\n(config)# "
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        self._instance.map_bidi("192.168.1.1/ethernet1-3", "192.168.1.1/ethernet1-4")
+        self._instance.cli.enable_mode_service.assert_called_once_with()
+        enable_context = self._instance.cli.enable_mode_service.return_value
+        enable_context.__exit__.assert_not_called()
+        self._instance.close()
+        enable_session = enable_context.__enter__.return_value
+        enable_session.session.disconnect.assert_called_once_with()
+        enable_context.__exit__.assert_called_once_with(None, None, None)
+
+    def test_inactive_session_reopened(self):
+        session = self._mock_session()
+        session.send_command.return_value = "patch created\n(config)# "
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        enable_context = self._instance.cli.enable_mode_service.return_value
+        enable_context.__enter__.return_value.session.active.return_value = False
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        self.assertEqual(self._instance.cli.enable_mode_service.call_count, 2)
+        enable_context.__exit__.assert_called_once_with(None, None, None)
+
+    def test_session_dropped_on_error(self):
+        session = self._mock_session()
+        session.send_command.return_value = "ERROR: Invalid interface\n(config)# "
+        with self.assertRaises(LayerOneDriverException):
+            self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        enable_context = self._instance.cli.enable_mode_service.return_value
+        self.assertIs(enable_context.__exit__.call_args[0][0], LayerOneDriverException)
+        session.send_command.return_value = "patch created\n(config)# "
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        self.assertEqual(self._instance.cli.enable_mode_service.call_count, 2)
+
+    def test_get_serial_number(self):
+        session = Mock()
+        session.send_command.return_value = "Serial Number  FOC12345678\n"
+        self.assertEqual(self._instance._get_serial_number(session), "FOC12345678")
+        session.send_command.return_value = "Serial \t Number\tFOC12345678\n"
+        self.assertEqual(self._instance._get_serial_number(session), "FOC12345678")
+
+    def test_map_clear_removes_peer_mapping(self):
+        session = self._mock_session()
+        session.send_command.side_effect = [
+            "patch ethernet1/1 ethernet1/2\n(config)# ",
+            "(config)# ",
+            "(config)# no patch ethernet1/1 ethernet1/2\n"
+            "patch deleted\n"
+            "(config)# no patch ethernet1/2 ethernet1/1\n"
+            "patch not found\n"
+            "(config-if)# ",
+        ]
+        self._instance.map_clear(["192.168.1.1/ethernet1-1"])
+        command = session.send_command.call_args[0][0]
+        self.assertIn("no patch ethernet1/1 ethernet1/2", command)
+        self.assertIn("interface ethernet1/2", command)
+        self.assertNotIn("None", command)
+        self.assertNotIn("no tap", command)
+
+    def test_map_clear_removes_mappings_in_both_directions(self):
+        session = self._mock_session()
+        session.send_command.side_effect = [
+            "patch Ethernet1/1 Ethernet1/2\n(config)# ",
+            "tap Ethernet1/2 Ethernet1/3\ntap Ethernet1/2 Ethernet1/4\n(config)# ",
+            "(config)# no patch ethernet1/1 ethernet1/2\n"
+            "patch deleted\n"
+            "(config)# no tap ethernet1/2 ethernet1/3\n"
+            "Removed output tap\n"
+            "(config)# no tap ethernet1/2 ethernet1/4\n"
+            "Removed output tap\n"
+            "(config-if)# ",
+        ]
+        self._instance.map_clear(["192.168.1.1/ethernet1-2", "192.168.1.1/ethernet1-1"])
+        self.assertEqual(session.send_command.call_count, 3)
+        commands = session.send_command.call_args[0][0].split("\n")
+        self.assertEqual(commands[:3], ["no patch ethernet1/1 ethernet1/2",
+                                        "no tap ethernet1/2 ethernet1/3",
+                                        "no tap ethernet1/2 ethernet1/4"])
+        self.assertEqual(commands[3:], ["interface ethernet1/2", "shutdown",
+                                        "interface ethernet1/1", "shutdown",
+                                        "interface ethernet1/3", "shutdown",
+                                        "interface ethernet1/4", "shutdown",
+                                        "show clock"])
+
+    def _mock_device_session(self, defined_sessions, cli_service_class):
+        settings = {"CLI.TYPE": ["SSH"], "CLI.PORTS": {"SSH": 22}, "CLI.SESSION_LIMIT": 1}
+        self._runtime_config_instance.read_key.side_effect = lambda key, default: settings[key]
+        device_session = Mock()
+        device_session.active.return_value = True
+        defined_sessions.return_value = [device_session]
+        cli_service_class.side_effect = lambda session, command_mode, logger: Mock(
+            session=session, send_command=Mock(return_value="Serial Number FOC1\n"))
+        device_session.disconnect.side_effect = lambda: setattr(
+            device_session.active, "return_value", False)
+        device_session.connect.side_effect = lambda prompt, logger: setattr(
+            device_session.active, "return_value", True)
+        return device_session
+
+    @patch("cisco_nexus.cli.cli_handler.DEFAULT_SESSION_POOL_TIMEOUT", 1)
+    @patch("cloudshell.cli.service.session_pool_context_manager.CliService")
+    @patch.object(CiscoL1CliHandler, "_defined_sessions")
+    def test_login_twice(self, defined_sessions, cli_service_class):
+        device_session = self._mock_device_session(defined_sessions, cli_service_class)
+        self._instance.login("192.168.1.1", "admin", "admin")
+        self._instance.login("192.168.1.1", "admin", "admin")
+        self.assertEqual(self._instance._switch_id, "FOC1")
+        self.assertEqual(device_session.connect.call_count, 1)
+        device_session.disconnect.assert_not_called()
+
+    @patch("cisco_nexus.cli.cli_handler.DEFAULT_SESSION_POOL_TIMEOUT", 1)
+    @patch("cloudshell.cli.service.session_pool_context_manager.CliService")
+    @patch.object(CiscoL1CliHandler, "_defined_sessions")
+    def test_login_with_new_credentials(self, defined_sessions, cli_service_class):
+        device_session = self._mock_device_session(defined_sessions, cli_service_class)
+        self._instance.login("192.168.1.1", "admin", "admin")
+        self._instance.login("192.168.1.1", "admin", "new_password")
+        self.assertEqual(device_session.connect.call_count, 2)
+        device_session.disconnect.assert_called_once_with()
+
+    def test_dropped_session_retried(self):
+        session = self._mock_session()
+        session.send_command.return_value = "patch created\n(config)# "
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        session.send_command.side_effect = chain([socket.error("Socket is closed")],
+                                                 repeat("patch created\n(config)# "))
+        self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        self.assertEqual(self._instance.cli.enable_mode_service.call_count, 2)
+
+    def test_new_session_not_retried(self):
+        session = self._mock_session()
+        session.send_command.side_effect = socket.error("Socket is closed")
+        with self.assertRaises(socket.error):
+            self._instance.map_bidi("192.168.1.1/ethernet1-1", "192.168.1.1/ethernet1-2")
+        self.assertEqual(self._instance.cli.enable_mode_service.call_count, 1)
+
+    def test_map_clear_keeps_peer_with_other_mappings(self):
+        session = self._mock_session()
+        session.send_command.side_effect = [
+            "(config)# ",
+            "tap Ethernet1/1 Ethernet1/2\ntap Ethernet1/1 Ethernet1/3\n(config)# ",
+            "(config)# no tap ethernet1/1 ethernet1/2\n"
+            "Removed output tap\n"
+            "(config-if)# ",
+        ]
+        self._instance.map_clear(["192.168.1.1/ethernet1-2"])
+        commands = session.send_command.call_args[0][0].split("\n")
+        self.assertEqual(commands, ["no tap ethernet1/1 ethernet1/2",
+                                    "interface ethernet1/2", "shutdown",
+                                    "show clock"])